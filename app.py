@@ -27,9 +27,12 @@ def test_integration():
         # Call the appropriate test function based on diagnostic mode
         if diagnostic_mode:
             results = test_shopify_integration.diagnose_shopify_api(shop_url, access_token, api_version)
+            circuit_breakers = test_shopify_integration.get_circuit_breaker_states(
+                [test_shopify_integration.get_diagnostic_domain(shop_url)], access_token)
             return jsonify({
                 'success': True,
                 'diagnostic_results': results,
+                'circuit_breakers': circuit_breakers,
                 'mode': 'diagnostic'
             })
         else:
@@ -38,6 +41,7 @@ def test_integration():
             return jsonify({
                 'success': True,
                 'results': results,
+                'circuit_breakers': results.get('circuit_breakers', {}),
                 'mode': 'integration'
             })
     except Exception as e:
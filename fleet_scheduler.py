@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+import functools
+import heapq
+import json
+import sys
+import time
+import traceback
+
+import test_shopify_integration
+
+# Worst-case outbound request cost of each kind of check. A read-only full probe tries up to
+# 7 domain variants on 5 API versions, then 6 endpoints and the access scopes.
+SCOPES_CHECK_COST = 1
+FULL_PROBE_COST = 7 * 5 + 6 + 1
+
+REQUIRED_PERMISSIONS = ["read_price_rules", "write_price_rules", "read_discounts", "write_discounts"]
+BASIC_TIER_PERMISSIONS = ["read_orders", "read_all_orders"]
+
+# Basic tier shops depend on order scopes, so they are re-checked twice as often
+BASIC_TIER_FACTOR = 0.5
+
+def get_shop_status(results):
+    """Classify full probe results as 'pass', 'warning' or 'fail' (same rules as print_summary)"""
+    permissions = results.get("permissions", {})
+    if not (results.get("connection") and
+            all(permissions.get(p) for p in REQUIRED_PERMISSIONS)):
+        return "fail"
+
+    # Read-only probes skip the creation checks, so only the write scopes above can be verified
+    if not results.get("read_only") and not (results.get("price_rule_creation") and
+                                             results.get("discount_code_creation")):
+        return "fail"
+
+    if (results.get("plan_name") or "").lower() == "basic":
+        if not all(permissions.get(p) for p in BASIC_TIER_PERMISSIONS):
+            return "warning"
+
+    return "pass"
+
+class FleetScheduler:
+    """Keep the integration status of a fleet of shops current with as few API calls as possible.
+
+    Shops sit in a priority queue ordered by when they are next due. A due shop first gets a
+    cheap scopes-only check; the full test_integration probe only runs when the scopes differ
+    from the last full probe, the scope check fails, the shop failed last time, or the last full
+    probe is too old. All checks draw from a shared outbound request budget that refills over
+    `budget_window` seconds. A due shop whose check doesn't fit the remaining budget keeps its
+    place in the queue while cheaper checks behind it go ahead.
+
+    The default full probe runs test_integration with read_only=True, so unattended runs never
+    create price rules or discount codes in merchant stores.
+    """
+
+    def __init__(self, request_budget=600, budget_window=3600,
+                 base_interval=6 * 3600, max_interval=24 * 3600, min_interval=15 * 60,
+                 failure_interval=30 * 60, full_probe_max_age=7 * 24 * 3600,
+                 scopes_check=None, full_probe=None, clock=time.time):
+        if request_budget < FULL_PROBE_COST:
+            # The budget never refills above request_budget, so a full probe could never start
+            raise ValueError(f"request_budget must be at least {FULL_PROBE_COST} (the worst-case cost of a full probe)")
+
+        self.request_budget = request_budget
+        self.budget_window = budget_window
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.min_interval = min_interval
+        self.failure_interval = failure_interval
+        self.full_probe_max_age = full_probe_max_age
+        self.scopes_check = scopes_check or test_shopify_integration.check_access_scopes
+        self.full_probe = full_probe or functools.partial(test_shopify_integration.test_integration, read_only=True)
+        self.clock = clock
+
+        self.shops = {}
+        self._queue = []
+        self._sequence = 0
+        self._tokens = float(request_budget)
+        self._last_refill = clock()
+
+    def add_shop(self, shop_url, access_token, plan_name=None):
+        """Add a shop to the fleet; new shops are due immediately"""
+        self.shops[shop_url] = {
+            "shop_url": shop_url,
+            "access_token": access_token,
+            "domain": test_shopify_integration.get_myshopify_domain(shop_url),
+            "plan_name": plan_name,
+            "scopes": None,
+            "status": None,
+            "scope_changes": 0,
+            "consecutive_unchanged": 0,
+            "pending_full_probe": True,
+            "last_checked": None,
+            "last_full_probe": None,
+            "last_results": None,
+            "next_due": None
+        }
+        self._push(shop_url, self.clock())
+
+    def remove_shop(self, shop_url):
+        """Stop tracking a shop; its queue entry is dropped lazily"""
+        self.shops.pop(shop_url, None)
+
+    def remaining_budget(self):
+        """Return the number of outbound requests currently available"""
+        self._refill(self.clock())
+        return self._tokens
+
+    def run_due(self):
+        """Check every shop that is due, in priority order, until the request budget runs out"""
+        now = self.clock()
+        self._refill(now)
+        checked = []
+        skipped = []
+
+        while self._queue and self._queue[0][0] <= now and self._tokens >= SCOPES_CHECK_COST:
+            entry = heapq.heappop(self._queue)
+            due, _, shop_url = entry
+            shop = self.shops.get(shop_url)
+            if shop is None or shop["next_due"] != due:
+                continue
+
+            # A full probe that doesn't fit yet keeps its place; cheaper checks behind it still run
+            cost = FULL_PROBE_COST if self._needs_full_probe(shop, now) else SCOPES_CHECK_COST
+            if self._tokens < cost:
+                skipped.append(entry)
+                continue
+
+            try:
+                checked.append(self._check_shop(shop, now))
+            except Exception as e:
+                # One broken shop must not stop the rest of the fleet
+                print(f"Error checking {shop_url}: {str(e)}")
+                print(traceback.format_exc())
+                shop["status"] = "fail"
+                shop["pending_full_probe"] = False
+                shop["consecutive_unchanged"] = 0
+                shop["last_checked"] = now
+                checked.append({"shop_url": shop_url, "check": "error", "changed": True,
+                                "status": "fail", "error": str(e)})
+            self._push(shop_url, now + self._next_interval(shop) if not shop["pending_full_probe"] else now)
+
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return checked
+
+    def run_forever(self, poll_interval=60):
+        """Run due checks in a loop, printing a line per checked shop"""
+        while True:
+            for record in self.run_due():
+                print(f"{record['shop_url']}: {record['check']} check, status {record['status']}"
+                      f"{' (changed)' if record['changed'] else ''}")
+            time.sleep(poll_interval)
+
+    def status(self):
+        """Return the current status of every shop in the fleet"""
+        return {
+            shop_url: {
+                "status": shop["status"],
+                "plan_name": shop["plan_name"],
+                "domain": shop["domain"],
+                "scope_changes": shop["scope_changes"],
+                "last_checked": shop["last_checked"],
+                "last_full_probe": shop["last_full_probe"],
+                "next_due": shop["next_due"]
+            }
+            for shop_url, shop in self.shops.items()
+        }
+
+    def _check_shop(self, shop, now):
+        record = {"shop_url": shop["shop_url"], "check": "scopes", "changed": False}
+
+        if not self._needs_full_probe(shop, now):
+            scopes = self._charged(self.scopes_check, shop["domain"], shop["access_token"])
+            shop["last_checked"] = now
+            # A failing shop needs a full probe to find out whether it has recovered
+            if scopes is not None and scopes == shop["scopes"] and shop["status"] != "fail":
+                shop["consecutive_unchanged"] += 1
+                record["status"] = shop["status"]
+                return record
+
+            # Something differs: escalate to a full probe, now if the budget allows or on the next run
+            shop["pending_full_probe"] = True
+            if self._tokens < FULL_PROBE_COST:
+                record["status"] = shop["status"]
+                record["escalation_deferred"] = True
+                return record
+
+        record["check"] = "full"
+        results = self._charged(self.full_probe, shop["shop_url"], shop["access_token"])
+
+        status = get_shop_status(results)
+        scopes = sorted(results["all_permissions"]) if results.get("all_permissions") is not None else None
+        scopes_changed = shop["scopes"] is not None and scopes is not None and scopes != shop["scopes"]
+        if scopes_changed:
+            shop["scope_changes"] += 1
+
+        record["changed"] = scopes_changed or status != shop["status"]
+        shop["consecutive_unchanged"] = 0 if record["changed"] else shop["consecutive_unchanged"] + 1
+        shop["status"] = status
+        if scopes is not None:
+            shop["scopes"] = scopes
+        shop["domain"] = results.get("official_myshopify_domain") or results.get("connected_domain") or shop["domain"]
+        shop["plan_name"] = results.get("plan_name") or shop["plan_name"]
+        shop["pending_full_probe"] = False
+        shop["last_checked"] = now
+        shop["last_full_probe"] = now
+        shop["last_results"] = results
+
+        record["status"] = status
+        return record
+
+    def _charged(self, check, *args):
+        # Charge the budget for the requests the check actually sent
+        sent_before = test_shopify_integration.get_request_count()
+        try:
+            return check(*args)
+        finally:
+            self._tokens -= test_shopify_integration.get_request_count() - sent_before
+
+    def _needs_full_probe(self, shop, now):
+        return (shop["pending_full_probe"] or
+                shop["last_full_probe"] is None or
+                now - shop["last_full_probe"] >= self.full_probe_max_age)
+
+    def _next_interval(self, shop):
+        # Healthy, unchanged shops back off exponentially up to max_interval
+        interval = min(self.base_interval * 2 ** min(shop["consecutive_unchanged"], 8), self.max_interval)
+
+        if (shop["plan_name"] or "").lower() == "basic":
+            interval *= BASIC_TIER_FACTOR
+
+        # Shops whose scopes have changed before are likely to change again
+        interval /= 1 + shop["scope_changes"]
+
+        if shop["status"] == "fail":
+            interval = min(interval, self.failure_interval)
+
+        return max(self.min_interval, min(interval, self.max_interval))
+
+    def _push(self, shop_url, due):
+        self.shops[shop_url]["next_due"] = due
+        self._sequence += 1
+        heapq.heappush(self._queue, (due, self._sequence, shop_url))
+
+    def _refill(self, now):
+        elapsed = max(0, now - self._last_refill)
+        self._tokens = min(self.request_budget,
+                           self._tokens + elapsed * self.request_budget / self.budget_window)
+        self._last_refill = now
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python fleet_scheduler.py <fleet.json> [--budget <requests>] [--window <seconds>]")
+        print("fleet.json is a list of {\"shop_url\": ..., \"access_token\": ..., \"plan_name\": ...} objects")
+        print("Example: python fleet_scheduler.py fleet.json --budget 600 --window 3600")
+        sys.exit(1)
+
+    request_budget = 600
+    budget_window = 3600
+
+    if "--budget" in sys.argv:
+        try:
+            request_budget = int(sys.argv[sys.argv.index("--budget") + 1])
+        except (IndexError, ValueError):
+            pass
+
+    if request_budget < FULL_PROBE_COST:
+        print(f"Error: --budget must be at least {FULL_PROBE_COST} (the worst-case cost of a full probe)")
+        sys.exit(1)
+
+    if "--window" in sys.argv:
+        try:
+            budget_window = int(sys.argv[sys.argv.index("--window") + 1])
+        except (IndexError, ValueError):
+            pass
+
+    with open(sys.argv[1]) as f:
+        fleet = json.load(f)
+
+    scheduler = FleetScheduler(request_budget=request_budget, budget_window=budget_window)
+    for shop in fleet:
+        scheduler.add_shop(shop["shop_url"], shop["access_token"], shop.get("plan_name"))
+
+    print(f"Scheduling {len(fleet)} shops with a budget of {request_budget} requests per {budget_window}s")
+    scheduler.run_forever()
@@ -121,7 +121,7 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(data => {
             if (data.success) {
-                displayResults(data.results);
+                displayResults(data.results, data.circuit_breakers);
             } else {
                 // Show error alert with message
                 const errorMessage = data.message || 'Unknown error occurred';
@@ -167,16 +167,20 @@ document.addEventListener('DOMContentLoaded', function() {
         
         document.getElementById('errors-list').innerHTML = '';
         document.getElementById('errors-section').classList.add('d-none');
+        document.getElementById('circuit-breakers-status').innerHTML = '';
+        document.getElementById('circuit-breakers-section').classList.add('d-none');
         overallStatus.innerHTML = '';
     }
     
-    function displayResults(results) {
+    function displayResults(results, circuitBreakers) {
         // Clear previous results
         document.getElementById('connection-status').innerHTML = '';
         document.getElementById('permissions-status').innerHTML = '';
         document.getElementById('operations-status').innerHTML = '';
         document.getElementById('errors-list').innerHTML = '';
         document.getElementById('errors-section').classList.add('d-none');
+        document.getElementById('circuit-breakers-status').innerHTML = '';
+        document.getElementById('circuit-breakers-section').classList.add('d-none');
         document.getElementById('final-result').innerHTML = '';
         document.getElementById('recommended-domain').innerHTML = '';
         overallStatus.innerHTML = '';
@@ -185,6 +189,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Transform backend data format to UI format if needed
         const transformedResults = transformResultsIfNeeded(results);
+        const circuitBreakerResults = transformCircuitBreakers(circuitBreakers || {});
         
         // Add overall status at the top
         let overallResult = transformedResults.overall_result || '';
@@ -278,6 +283,21 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }, 700);
         
+        // Process circuit breaker states if any
+        setTimeout(() => {
+            if (circuitBreakerResults.length > 0) {
+                const circuitBreakersStatusEl = document.getElementById('circuit-breakers-status');
+                document.getElementById('circuit-breakers-section').classList.remove('d-none');
+                circuitBreakerResults.forEach((result, index) => {
+                    setTimeout(() => {
+                        const statusItem = createStatusItem(result);
+                        circuitBreakersStatusEl.appendChild(statusItem);
+                        statusItem.classList.add('fade-in');
+                    }, index * 100);
+                });
+            }
+        }, 750);
+        
         // Set final result
         setTimeout(() => {
             if (transformedResults.result_message) {
@@ -485,6 +505,31 @@ document.addEventListener('DOMContentLoaded', function() {
         return transformed;
     }
     
+    // Helper function to turn per-host circuit breaker state into status items
+    function transformCircuitBreakers(circuitBreakers) {
+        const stateStatus = {
+            'closed': 'SUCCESS',
+            'half_open': 'WARNING',
+            'open': 'ERROR'
+        };
+        
+        return Object.entries(circuitBreakers).map(([host, breaker]) => {
+            let message = `State: ${breaker.state.replace('_', '-')}, tripped ${breaker.trip_count} time${breaker.trip_count === 1 ? '' : 's'}`;
+            if (breaker.state === 'open' && breaker.retry_in_seconds !== null) {
+                message += `, retrying in ${breaker.retry_in_seconds}s`;
+            }
+            if (breaker.state !== 'closed' && breaker.last_diagnosis) {
+                message += `. ${breaker.last_diagnosis}`;
+            }
+            
+            return {
+                status: stateStatus[breaker.state] || 'WARNING',
+                name: host,
+                message: message
+            };
+        });
+    }
+    
     // Helper function to create status items with improved design
     function createStatusItem(result) {
         const div = document.createElement('div');
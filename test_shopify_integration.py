@@ -3,9 +3,164 @@ import requests
 import json
 import sys
 import datetime
+import hashlib
+import threading
 import time
 from urllib.parse import urlparse
 
+# Circuit breaker settings shared by every probe path
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN_SECONDS = 300
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while a host's circuit is open"""
+
+    def __init__(self, host, diagnosis):
+        super().__init__(f"Circuit open for {host}: {diagnosis}")
+        self.host = host
+        self.diagnosis = diagnosis
+
+class CircuitBreaker:
+    """Track repeated hard failures for one (host, token) pair.
+
+    The circuit opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures and rejects requests
+    until the cooldown has passed. Then a single half-open trial request is let through: success
+    closes the circuit, failure re-opens it for another cooldown.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.trip_count = 0
+        self.last_diagnosis = None
+        self._opened_at = None
+        self._trial_started_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "closed":
+                return True
+            if self.state == "open" and now - self._opened_at >= CIRCUIT_COOLDOWN_SECONDS:
+                self.state = "half_open"
+                self._trial_started_at = now
+                return True
+            # A trial that never reported back (e.g. an unexpected exception) must not block forever
+            if self.state == "half_open" and now - self._trial_started_at >= CIRCUIT_COOLDOWN_SECONDS:
+                self._trial_started_at = now
+                return True
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < CIRCUIT_COOLDOWN_SECONDS
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_started_at = None
+
+    def record_failure(self, diagnosis):
+        with self._lock:
+            self._record_failure(diagnosis)
+
+    def record_trial_failure(self, diagnosis):
+        """Record a failure only if it is the result of the half-open trial request"""
+        with self._lock:
+            if self.state == "half_open":
+                self._record_failure(diagnosis)
+
+    def _record_failure(self, diagnosis):
+        self.consecutive_failures += 1
+        self.last_diagnosis = diagnosis
+        if self.state == "half_open" or (self.state == "closed" and
+                                         self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD):
+            self.state = "open"
+            self.trip_count += 1
+            self._opened_at = time.monotonic()
+            self._trial_started_at = None
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = max(0, round(CIRCUIT_COOLDOWN_SECONDS - (time.monotonic() - self._opened_at)))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "trip_count": self.trip_count,
+                "last_diagnosis": self.last_diagnosis,
+                "retry_in_seconds": retry_in
+            }
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+_request_counter = threading.local()
+
+def get_request_count():
+    """Return how many requests this thread has actually sent through shopify_request"""
+    return getattr(_request_counter, "count", 0)
+
+def _circuit_key(host, access_token):
+    return (host.lower(), hashlib.sha256((access_token or '').encode()).hexdigest()[:16])
+
+def get_circuit_breaker(host, access_token):
+    """Return the shared circuit breaker for a host and token, creating it if needed"""
+    key = _circuit_key(host, access_token)
+    with _circuit_breakers_lock:
+        if key not in _circuit_breakers:
+            _circuit_breakers[key] = CircuitBreaker(host)
+        return _circuit_breakers[key]
+
+def get_circuit_breaker_states(hosts, access_token):
+    """Return breaker snapshots for the given hosts that have seen at least one request"""
+    states = {}
+    with _circuit_breakers_lock:
+        breakers = {host: _circuit_breakers.get(_circuit_key(host, access_token)) for host in hosts}
+    for host, breaker in breakers.items():
+        if breaker is not None:
+            states[host] = breaker.snapshot()
+    return states
+
+def shopify_request(method, url, headers, **kwargs):
+    """Send a request through the circuit breaker for its host and token.
+
+    Connection errors, timeouts and 401/403 responses on shop.json count as failures, as does
+    any 401/403 on the half-open trial request.
+    Raises CircuitOpenError without touching the network while the circuit is open.
+    """
+    host = urlparse(url).netloc
+    breaker = get_circuit_breaker(host, headers.get("X-Shopify-Access-Token"))
+    if not breaker.allow_request():
+        raise CircuitOpenError(host, breaker.last_diagnosis)
+
+    _request_counter.count = get_request_count() + 1
+    try:
+        response = requests.request(method, url, headers=headers, **kwargs)
+    except requests.exceptions.Timeout as e:
+        breaker.record_failure(f"Timeout: {str(e)}")
+        raise
+    except requests.exceptions.ConnectionError as e:
+        breaker.record_failure(f"Connection error (domain down or unreachable): {str(e)}")
+        raise
+
+    is_shop_info = urlparse(url).path.endswith("/shop.json")
+    if is_shop_info and response.status_code == 401:
+        breaker.record_failure("Unauthorized (401) on shop.json: token has been revoked or is invalid")
+    elif is_shop_info and response.status_code == 403:
+        breaker.record_failure("Forbidden (403) on shop.json: token lacks access or an IP allowlist is blocking requests")
+    elif response.status_code in (401, 403):
+        # 401/403 on other endpoints usually means a missing scope, which says nothing about the host,
+        # but a half-open trial must still settle the circuit one way or the other
+        breaker.record_trial_failure(f"{response.status_code} on {urlparse(url).path} during half-open trial")
+    else:
+        breaker.record_success()
+
+    return response
+
 def get_myshopify_domain(shop_url):
     """Convert any shop URL format to the myshopify domain format"""
     # Remove protocol if present
@@ -36,8 +191,32 @@ def get_myshopify_domain(shop_url):
         print(f"Error parsing domain: {e}")
         return shop_url
 
-def test_integration(shop_url, access_token, api_version='2023-10'):
-    """Test the full integration flow with a shop"""
+def check_access_scopes(shop_domain, access_token):
+    """Fetch only the granted access scopes for a shop (a single API call).
+
+    Returns a sorted list of scope handles, or None if the scopes could not be read.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "X-Shopify-Access-Token": access_token
+    }
+
+    try:
+        response = shopify_request("GET", f"https://{shop_domain}/admin/oauth/access_scopes.json", headers=headers, timeout=10)
+        if response.status_code == 200:
+            return sorted(scope.get('handle') for scope in response.json().get('access_scopes', []))
+        print(f"❌ Scope check failed for {shop_domain} (Status code: {response.status_code})")
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Scope check failed for {shop_domain} (Request error: {str(e)})")
+
+    return None
+
+def test_integration(shop_url, access_token, api_version='2023-10', read_only=False, _fallback=False):
+    """Test the full integration flow with a shop
+
+    With read_only=True the price rule and discount code creation checks are skipped,
+    so nothing is written to the store.
+    """
     results = {
         "connection": False,
         "permissions": {
@@ -52,7 +231,8 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
         "discount_code_creation": False,
         "original_domain": shop_url,
         "errors": [],
-        "api_version_tested": api_version
+        "api_version_tested": api_version,
+        "read_only": read_only
     }
     
     # Get possible myshopify domain
@@ -103,7 +283,7 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
         
         # 1. Test basic connection
         try:
-            response = requests.get(f"https://{domain}/admin/api/{api_version}/shop.json", headers=headers, timeout=10)
+            response = shopify_request("GET", f"https://{domain}/admin/api/{api_version}/shop.json", headers=headers, timeout=10)
             if response.status_code == 200:
                 print(f"✅ Connection successful with domain: {domain}")
                 results["connection"] = True
@@ -131,6 +311,10 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
                     results["errors"].append(f"Connection error with {domain}: {error_message}")
                 except:
                     results["errors"].append(f"Connection error with {domain}: Status code {response.status_code}")
+        except CircuitOpenError as e:
+            print(f"⛔ Skipped domain: {domain} (Circuit open: {e.diagnosis})")
+            results["errors"].append(str(e))
+            continue
         except requests.exceptions.ConnectionError as e:
             print(f"❌ Connection failed with domain: {domain} (Domain resolution error)")
             results["errors"].append(f"Domain resolution error with {domain}: {str(e)}")
@@ -143,16 +327,26 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
     if not working_domain:
         results["errors"].append("Could not establish connection with any domain format")
         
+        # Fallback runs don't start fallbacks of their own
+        if _fallback:
+            results["circuit_breakers"] = get_circuit_breaker_states(domains_to_try, access_token)
+            return results
+        
         # Try with different API versions as fallback
         fallback_versions = ['2024-01', '2023-07', '2023-04', '2022-10']
         for fallback_version in fallback_versions:
             if fallback_version != api_version:
+                # Open domains are skipped inside each fallback run; stop once none is left to try
+                if all(get_circuit_breaker(domain, access_token).is_open() for domain in domains_to_try):
+                    print("\n⛔ All domains have open circuits, skipping fallback API versions")
+                    break
                 print(f"\nTrying with fallback API version: {fallback_version}")
-                fallback_results = test_integration(shop_url, access_token, fallback_version)
+                fallback_results = test_integration(shop_url, access_token, fallback_version, read_only, _fallback=True)
                 if fallback_results["connection"]:
                     print(f"✅ Connection successful with API version: {fallback_version}")
                     return fallback_results
         
+        results["circuit_breakers"] = get_circuit_breaker_states(domains_to_try, access_token)
         return results
     
     # 2. Test endpoints with increasing permission requirements
@@ -186,7 +380,7 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
         print(f"URL: {url}")
         
         try:
-            response = requests.get(url, headers=headers)
+            response = shopify_request("GET", url, headers=headers)
             status_code = response.status_code
             print(f"  Status: {status_code}")
             
@@ -273,7 +467,7 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
     
     # 3. Check permissions via OAuth
     try:
-        response = requests.get(f"https://{working_domain}/admin/oauth/access_scopes.json", headers=headers)
+        response = shopify_request("GET", f"https://{working_domain}/admin/oauth/access_scopes.json", headers=headers)
         if response.status_code == 200:
             scopes = [scope.get('handle') for scope in response.json().get('access_scopes', [])]
             results["all_permissions"] = scopes
@@ -298,7 +492,7 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
         results["errors"].append(f"Error checking permissions: {str(e)}")
     
     # 4. Test creating a price rule
-    if results["permissions"]["write_price_rules"]:
+    if results["permissions"]["write_price_rules"] and not read_only:
         try:
             timestamp = int(time.time())
             price_rule_data = {
@@ -316,7 +510,8 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
                 }
             }
             
-            response = requests.post(
+            response = shopify_request(
+                "POST",
                 f"https://{working_domain}/admin/api/{api_version}/price_rules.json",
                 headers=headers,
                 data=json.dumps(price_rule_data)
@@ -339,7 +534,8 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
                             }
                         }
                         
-                        response = requests.post(
+                        response = shopify_request(
+                            "POST",
                             f"https://{working_domain}/admin/api/{api_version}/price_rules/{price_rule_id}/discount_codes.json",
                             headers=headers,
                             data=json.dumps(discount_code_data)
@@ -364,6 +560,7 @@ def test_integration(shop_url, access_token, api_version='2023-10'):
         except Exception as e:
             results["errors"].append(f"Error creating price rule: {str(e)}")
     
+    results["circuit_breakers"] = get_circuit_breaker_states(set(domains_to_try) | {working_domain}, access_token)
     return results
 
 def print_summary(results):
@@ -423,6 +620,13 @@ def print_summary(results):
         status = "✅" if results.get("orders_api_access") else "❌"
         print(f"  {status} Orders API access")
     
+    # Circuit breakers
+    if results.get("circuit_breakers"):
+        print("\nCIRCUIT BREAKERS:")
+        for host, circuit in results["circuit_breakers"].items():
+            status_icon = "✅" if circuit["state"] == "closed" else "⛔"
+            print(f"  {status_icon} {host}: {circuit['state']} (tripped {circuit['trip_count']} times)")
+    
     # Errors
     if results.get("errors"):
         print("\nERRORS:")
@@ -456,13 +660,18 @@ def print_summary(results):
     
     print("="*50)
 
+def get_diagnostic_domain(shop):
+    """Return the domain diagnose_shopify_api sends its requests to"""
+    if '.myshopify.com' not in shop:
+        return f"{shop}.myshopify.com"
+    return shop
+
 def diagnose_shopify_api(shop, token, api_version='2023-10'):
     """Diagnose Shopify API access issues for specific stores"""
     print(f"Testing Shopify API access for {shop} with token {token[:5]}...")
     
     # Normalize shop URL
-    if '.myshopify.com' not in shop:
-        shop = f"{shop}.myshopify.com"
+    shop = get_diagnostic_domain(shop)
     
     # Test endpoints with increasing permission requirements
     headers = {
@@ -497,6 +706,8 @@ def diagnose_shopify_api(shop, token, api_version='2023-10'):
         api_versions_to_try.extend(['2024-01', '2023-07', '2023-04', '2022-10'])
     
     version_results = {}
+    breaker = get_circuit_breaker(shop, token)
+    circuit_open = False
     
     for version in api_versions_to_try:
         print(f"\nTesting with API version: {version}")
@@ -510,7 +721,7 @@ def diagnose_shopify_api(shop, token, api_version='2023-10'):
             print(f"  URL: {url}")
             
             try:
-                response = requests.get(url, headers=headers)
+                response = shopify_request("GET", url, headers=headers)
                 status_code = response.status_code
                 print(f"    Status: {status_code}")
                 
@@ -546,6 +757,17 @@ def diagnose_shopify_api(shop, token, api_version='2023-10'):
                         "error": response.text
                     })
                     
+            except CircuitOpenError as e:
+                # Every remaining request would fail the same way, so stop the sweep
+                print(f"    Circuit open: {e.diagnosis}")
+                endpoint_results.append({
+                    "name": name,
+                    "status": "Circuit Open",
+                    "result": "Skipped",
+                    "error": e.diagnosis
+                })
+                circuit_open = True
+                break
             except Exception as e:
                 print(f"    Error: {str(e)}")
                 endpoint_results.append({
@@ -556,6 +778,8 @@ def diagnose_shopify_api(shop, token, api_version='2023-10'):
                 })
         
         version_results[version] = endpoint_results
+        if circuit_open:
+            break
     
     # Summarize results
     print("\n===== ACCESS SUMMARY =====")
@@ -586,6 +810,10 @@ def diagnose_shopify_api(shop, token, api_version='2023-10'):
         print("1. Token has been revoked or is invalid")
         print("2. IP restrictions are in place on the Shopify store")
         print("3. The shop domain is incorrect")
+        circuit = breaker.snapshot()
+        if circuit["last_diagnosis"]:
+            print(f"Last recorded failure: {circuit['last_diagnosis']}")
+            print(f"Circuit breaker: {circuit['state']} (tripped {circuit['trip_count']} times)")
     else:
         first_version = list(version_results.keys())[0]
         if any(r["name"] == "Orders" and r["status"] == 200 for r in version_results[first_version]):